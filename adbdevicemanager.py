@@ -1,22 +1,69 @@
+import functools
+import io
 import os
 import re
+import select
 import shlex
 import shutil
 import subprocess
 import sys
+import threading
 import time
+import uuid
+from collections.abc import Callable
 from datetime import datetime
 from pathlib import Path
 from urllib import error as urlerror
 from urllib import parse as urlparse
 from urllib import request as urlrequest
 
+from lxml import etree
 from PIL import Image as PILImage
 from ppadb.client import Client as AdbClient
 
+# Shared adb-server client; it is stateless, so one instance serves every call.
+_ADB_CLIENT = AdbClient()
+
+# "package:" prefix on each line of `pm list packages` output.
+_PACKAGE_PREFIX_RE = re.compile(rb"^package:", re.MULTILINE)
+
+# Body of the "Non-Data Actions:" block in the Activity Resolver Table of
+# `dumpsys package`, up to the next blank line.
+_NON_DATA_ACTIONS_RE = re.compile(
+    r"Activity Resolver Table:.*?\n  Non-Data Actions:(.*?)(?:\n\n|\Z)", re.DOTALL
+)
+_ACTION_LINE_RE = re.compile(r"^[ \t]*((?:android|com)\.[^\n]*?)[ \t\r]*$", re.MULTILINE)
+
+# Block size used when reading log files backwards from EOF.
+_TAIL_CHUNK_SIZE = 8192
+
+# uiautomator bounds look like "[x1,y1][x2,y2]".
+_BOUNDS_RE = re.compile(r"\[(\d+),(\d+)\]\[(\d+),(\d+)\]")
+
+
+def _bounds_center(bounds: str) -> tuple[int, int] | None:
+    """Return the center point of a uiautomator bounds string."""
+    match = _BOUNDS_RE.match(bounds)
+    if not match:
+        return None
+    x1, y1, x2, y2 = map(int, match.groups())
+    return (x1 + x2) // 2, (y1 + y2) // 2
+
+
+@functools.lru_cache(maxsize=16)
+def _split_args(args: str, posix: bool) -> tuple[str, ...]:
+    """shlex.split, memoized for repeated flutter run/attach invocations."""
+    return tuple(shlex.split(args, posix=posix))
+
 
 class AdbDeviceManager:
-    def __init__(self, device_name: str | None = None, exit_on_error: bool = True) -> None:
+    def __init__(
+        self,
+        device_name: str | None = None,
+        exit_on_error: bool = True,
+        persistent_shell: bool = False,
+        log_fn: Callable[..., None] = print,
+    ) -> None:
         """
         Initialize the ADB Device Manager
 
@@ -24,11 +71,15 @@ class AdbDeviceManager:
             device_name: Optional name/serial of the device to manage.
                          If None, attempts to auto-select if only one device is available.
             exit_on_error: Whether to exit the program if device initialization fails
+            persistent_shell: Run shell commands through one long-lived `adb shell`
+                              session instead of a new adb-server connection per command
+            log_fn: print-compatible callable used for status and error messages
         """
+        self._log = log_fn
         if not self.check_adb_installed():
             error_msg = "adb is not installed or not in PATH. Please install adb and ensure it is in your PATH."
             if exit_on_error:
-                print(error_msg, file=sys.stderr)
+                self._log(error_msg, file=sys.stderr)
                 sys.exit(1)
             else:
                 raise RuntimeError(error_msg)
@@ -37,7 +88,7 @@ class AdbDeviceManager:
         if not available_devices:
             error_msg = "No devices connected. Please connect a device and try again."
             if exit_on_error:
-                print(error_msg, file=sys.stderr)
+                self._log(error_msg, file=sys.stderr)
                 sys.exit(1)
             else:
                 raise RuntimeError(error_msg)
@@ -48,7 +99,7 @@ class AdbDeviceManager:
             if device_name not in available_devices:
                 error_msg = f"Device {device_name} not found. Available devices: {available_devices}"
                 if exit_on_error:
-                    print(error_msg, file=sys.stderr)
+                    self._log(error_msg, file=sys.stderr)
                     sys.exit(1)
                 else:
                     raise RuntimeError(error_msg)
@@ -56,12 +107,12 @@ class AdbDeviceManager:
         else:  # No device_name provided, try auto-selection
             if len(available_devices) == 1:
                 selected_device_name = available_devices[0]
-                print(
+                self._log(
                     f"No device specified, automatically selected: {selected_device_name}")
             elif len(available_devices) > 1:
                 error_msg = f"Multiple devices connected: {available_devices}. Please specify a device in config.yaml or connect only one device."
                 if exit_on_error:
-                    print(error_msg, file=sys.stderr)
+                    self._log(error_msg, file=sys.stderr)
                     sys.exit(1)
                 else:
                     raise RuntimeError(error_msg)
@@ -69,15 +120,29 @@ class AdbDeviceManager:
 
         # At this point, selected_device_name should always be set due to the logic above
         # Initialize the device
-        self.device = AdbClient().device(selected_device_name)
+        self.device = _ADB_CLIENT.device(selected_device_name)
         self.device_serial = selected_device_name
         self.flutter_process: subprocess.Popen | None = None
         self.flutter_log_path: str | None = None
         self._flutter_log_handle = None
+        self.persistent_shell = persistent_shell
+        self._shell_session: subprocess.Popen | None = None
+        self._shell_lock = threading.Lock()
 
     @staticmethod
-    def check_adb_installed() -> bool:
-        """Check if ADB is installed on the system."""
+    @functools.lru_cache(maxsize=2)
+    def check_adb_installed(verify_working: bool = False) -> bool:
+        """
+        Check if ADB is installed on the system.
+
+        Args:
+            verify_working: Also run `adb version` to confirm the binary executes,
+                            instead of only looking it up on PATH.
+        """
+        if shutil.which("adb") is None:
+            return False
+        if not verify_working:
+            return True
         try:
             subprocess.run(["adb", "version"], check=True,
                            stdout=subprocess.PIPE)
@@ -88,69 +153,174 @@ class AdbDeviceManager:
     @staticmethod
     def get_available_devices() -> list[str]:
         """Get a list of available devices."""
-        return [device.serial for device in AdbClient().devices()]
+        return [device.serial for device in _ADB_CLIENT.devices()]
+
+    def _spawn_shell_session(self) -> subprocess.Popen:
+        return subprocess.Popen(
+            ["adb", "-s", self.device_serial, "shell"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+        )
+
+    def _close_shell_session(self) -> None:
+        session = self._shell_session
+        if session is None:
+            return
+        if session.poll() is None:
+            session.kill()
+            session.wait(timeout=5)
+        for pipe in (session.stdin, session.stdout):
+            try:
+                pipe.close()
+            except OSError:
+                pass
+        self._shell_session = None
+
+    def _run_in_shell_session(self, command: str) -> bytes | None:
+        """
+        Run `command` in the long-lived `adb shell` session and return its raw output.
+        Returns None if the session cannot be started or exits without any output,
+        in which case persistent_shell is turned off.
+        """
+        with self._shell_lock:
+            if self._shell_session is None or self._shell_session.poll() is not None:
+                self._close_shell_session()
+                try:
+                    self._shell_session = self._spawn_shell_session()
+                except OSError as exc:
+                    self._log(
+                        f"Could not start persistent adb shell ({exc}); using one-off shell calls.",
+                        file=sys.stderr,
+                    )
+                    self.persistent_shell = False
+                    return None
+
+            # The command runs in its own `sh -c` so unbalanced quoting cannot
+            # leave the session waiting for input, and reads /dev/null so it
+            # cannot consume the commands queued behind it. The end marker is
+            # printed on a line of its own.
+            marker = f"__MCP_END_{uuid.uuid4().hex}__"
+            line = f"sh -c {shlex.quote(command)} </dev/null 2>&1; printf '\\n%s\\n' {marker}\n"
+            session = self._shell_session
+            output_lines = []
+            finished = False
+            try:
+                session.stdin.write(line.encode("utf-8"))
+                session.stdin.flush()
+            except OSError:
+                # The session already exited; still read what it printed.
+                pass
+            try:
+                while True:
+                    output_line = session.stdout.readline()
+                    if not output_line:
+                        break
+                    if output_line.rstrip(b"\r\n") == marker.encode():
+                        finished = True
+                        break
+                    output_lines.append(output_line)
+            except OSError:
+                pass
+
+            if not finished:
+                self._close_shell_session()
+                diagnostic = b"".join(output_lines).decode("utf-8", errors="replace").strip()
+                if diagnostic:
+                    raise RuntimeError(f"adb shell session closed unexpectedly: {diagnostic}")
+                self._log(
+                    "Persistent adb shell exited without output; using one-off shell calls.",
+                    file=sys.stderr,
+                )
+                self.persistent_shell = False
+                return None
+
+        output = b"".join(output_lines)
+        # Drop the newline printed ahead of the marker.
+        if output.endswith(b"\r\n"):
+            return output[:-2]
+        if output.endswith(b"\n"):
+            return output[:-1]
+        return output
+
+    def _shell(self, command: str) -> str:
+        """Run a device shell command and return its output."""
+        if self.persistent_shell:
+            output = self._run_in_shell_session(command)
+            if output is not None:
+                return output.decode("utf-8", errors="replace")
+        return self.device.shell(command)
+
+    def _shell_bytes(self, command: str) -> bytes:
+        """Run a shell command and return its raw output without decoding it."""
+        if self.persistent_shell:
+            output = self._run_in_shell_session(command)
+            if output is not None:
+                return output
+
+        chunks: list[bytes] = []
+
+        def read_all(connection) -> None:
+            chunks.append(bytes(connection.read_all()))
+            connection.close()
+
+        self.device.shell(command, handler=read_all)
+        return b"".join(chunks)
 
     def get_packages(self) -> str:
         command = "pm list packages"
-        packages = self.device.shell(command).strip().split("\n")
-        result = [package[8:] for package in packages]
-        output = "\n".join(result)
-        return output
+        raw = self._shell_bytes(command)
+        return _PACKAGE_PREFIX_RE.sub(b"", raw).strip().decode("utf-8", errors="replace")
 
     def get_package_action_intents(self, package_name: str) -> list[str]:
         command = f"dumpsys package {package_name}"
-        output = self.device.shell(command)
-
-        resolver_table_start = output.find("Activity Resolver Table:")
-        if resolver_table_start == -1:
-            return []
-        resolver_section = output[resolver_table_start:]
+        output = self._shell(command)
 
-        non_data_start = resolver_section.find("\n  Non-Data Actions:")
-        if non_data_start == -1:
+        match = _NON_DATA_ACTIONS_RE.search(output)
+        if not match:
             return []
+        return _ACTION_LINE_RE.findall(match.group(1))
 
-        section_end = resolver_section[non_data_start:].find("\n\n")
-        if section_end == -1:
-            non_data_section = resolver_section[non_data_start:]
-        else:
-            non_data_section = resolver_section[
-                non_data_start: non_data_start + section_end
-            ]
-
-        actions = []
-        for line in non_data_section.split("\n"):
-            line = line.strip()
-            if line.startswith("android.") or line.startswith("com."):
-                actions.append(line)
-
-        return actions
+    @staticmethod
+    def _strip_adb_prefix(command: str) -> str:
+        if command.startswith("adb shell "):
+            return command[10:]
+        if command.startswith("adb "):
+            return command[4:]
+        return command
 
     def execute_adb_shell_command(self, command: str) -> str:
         """Executes an ADB command and returns the output."""
-        if command.startswith("adb shell "):
-            command = command[10:]
-        elif command.startswith("adb "):
-            command = command[4:]
-        result = self.device.shell(command)
+        result = self._shell(self._strip_adb_prefix(command))
         return result
 
+    def shell_batch(self, commands: list[str]) -> str:
+        """
+        Runs several shell commands in a single adb round-trip.
+
+        The commands are joined with newlines, so each one runs even if an earlier
+        one fails, and one ending in `;` or `&` or holding a `#` comment cannot
+        break the ones after it. Their combined output is returned.
+        """
+        if not commands:
+            return ""
+        return self._shell("\n".join(self._strip_adb_prefix(command) for command in commands))
+
     def launch_app(self, package_name: str, activity_name: str | None = None, stop_first: bool = False) -> str:
         """Launches an Android app by package name and optional activity."""
-        output_parts = []
-        if stop_first:
-            self.device.shell(f"am force-stop {package_name}")
-            output_parts.append(f"Force-stopped {package_name}")
-
         if activity_name:
             component = activity_name if "/" in activity_name else f"{package_name}/{activity_name}"
-            launch_output = self.device.shell(f"am start -n {component}")
+            command = f"am start -n {shlex.quote(component)}"
         else:
-            launch_output = self.device.shell(
-                f"monkey -p {package_name} -c android.intent.category.LAUNCHER 1"
-            )
+            command = f"monkey -p {shlex.quote(package_name)} -c android.intent.category.LAUNCHER 1"
 
-        launch_output = launch_output.strip()
+        output_parts = []
+        if stop_first:
+            # Chain the stop into the launch so both run in one adb shell round-trip.
+            command = f"am force-stop {shlex.quote(package_name)}; {command}"
+            output_parts.append(f"Force-stopped {package_name}")
+
+        launch_output = self._shell(command).strip()
         if launch_output:
             output_parts.append(launch_output)
 
@@ -160,15 +330,81 @@ class AdbDeviceManager:
         return "\n".join(output_parts)
 
     @staticmethod
-    def _tail_file(file_path: str, lines: int = 60) -> str:
+    def _tail_file(file_path: str, lines: int = 60, drop_cached_prefix: bool = False) -> str:
         if not os.path.exists(file_path):
             return f"No log file found at {file_path}"
-        with open(file_path, encoding="utf-8", errors="replace") as handle:
-            file_lines = handle.readlines()
+        with open(file_path, "rb") as handle:
+            # Read backwards from EOF only until the requested lines are covered,
+            # so long-running logs are not loaded whole.
+            position = handle.seek(0, os.SEEK_END)
+            data = b""
+            while position > 0 and data.count(b"\n") <= lines:
+                read_size = min(_TAIL_CHUNK_SIZE, position)
+                position -= read_size
+                handle.seek(position)
+                data = handle.read(read_size) + data
+            if drop_cached_prefix and position > 0 and hasattr(os, "posix_fadvise"):
+                # The part before the tail will not be read again; let the kernel drop it from the page cache.
+                os.posix_fadvise(handle.fileno(), 0, position, os.POSIX_FADV_DONTNEED)
+        # newline=None applies the same universal-newline handling as text-mode open().
+        file_lines = io.StringIO(data.decode("utf-8", errors="replace"), newline=None).readlines()
         if not file_lines:
             return "(log file is empty)"
         return "".join(file_lines[-lines:]).rstrip()
 
+    @staticmethod
+    def _open_pidfd(pid: int) -> int | None:
+        """
+        Open a pidfd for `pid`, or return None when pidfds are unavailable
+        (non-Linux, Python < 3.9 or kernel < 5.3).
+        """
+        if not hasattr(os, "pidfd_open") or not hasattr(select, "poll"):
+            return None
+        try:
+            return os.pidfd_open(pid)
+        except OSError:
+            return None
+
+    @staticmethod
+    def _poll_pidfd(pidfd: int, timeout: float) -> bool:
+        """Sleep until the pidfd's process exits; False if `timeout` seconds elapse first."""
+        poller = select.poll()
+        poller.register(pidfd, select.POLLIN)
+        return bool(poller.poll(int(max(0, timeout) * 1000)))
+
+    @classmethod
+    def _pidfd_wait(cls, pid: int, timeout: float) -> bool | None:
+        """
+        Sleep on a pidfd until `pid` exits or `timeout` seconds elapse.
+        Returns True if the process exited, False on timeout, and None when
+        pidfds are unavailable.
+        """
+        pidfd = cls._open_pidfd(pid)
+        if pidfd is None:
+            return None
+        try:
+            return cls._poll_pidfd(pidfd, timeout)
+        finally:
+            os.close(pidfd)
+
+    @classmethod
+    def _wait_for_exit(cls, process: subprocess.Popen, timeout: float, pidfd: int | None) -> bool:
+        """
+        Wait for `process` to exit and reap it, sleeping on `pidfd` when one is given.
+        Returns False if it is still running after `timeout` seconds.
+        """
+        if pidfd is None:
+            try:
+                process.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                return False
+            return True
+
+        if not cls._poll_pidfd(pidfd, timeout):
+            return False
+        process.wait(timeout=0)
+        return True
+
     def _resolve_flutter_executable(self, flutter_executable: str) -> str:
         # If an explicit file path is provided, use it directly.
         if os.path.sep in flutter_executable or (
@@ -222,10 +458,15 @@ class AdbDeviceManager:
 
         command = [flutter_cmd, "run", "-d", self.device_serial, "-t", target]
         if additional_args:
-            command.extend(shlex.split(additional_args, posix=os.name != "nt"))
+            command.extend(_split_args(additional_args, posix=os.name != "nt"))
 
         self.flutter_log_path = os.path.join(project_dir, ".mcp_flutter_run.log")
-        self._flutter_log_handle = open(self.flutter_log_path, "w", encoding="utf-8")
+        log_fd = os.open(
+            self.flutter_log_path,
+            os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_APPEND | getattr(os, "O_CLOEXEC", 0),
+            0o644,
+        )
+        self._flutter_log_handle = os.fdopen(log_fd, "w", buffering=1, encoding="utf-8")
 
         creationflags = getattr(subprocess, "CREATE_NEW_PROCESS_GROUP", 0)
         self.flutter_process = subprocess.Popen(
@@ -238,8 +479,14 @@ class AdbDeviceManager:
             bufsize=1,
             creationflags=creationflags,
         )
+        if os.name != "nt":
+            # Key commands must never stall the server if flutter stops reading stdin.
+            os.set_blocking(self.flutter_process.stdin.fileno(), False)
 
-        time.sleep(max(0, startup_wait_seconds))
+        # Return as soon as flutter exits early instead of always sleeping
+        # for the full startup window.
+        if self._pidfd_wait(self.flutter_process.pid, startup_wait_seconds) is None:
+            time.sleep(max(0, startup_wait_seconds))
 
         if self.flutter_process.poll() is not None:
             exit_code = self.flutter_process.returncode
@@ -255,48 +502,81 @@ class AdbDeviceManager:
             f"Log file: {self.flutter_log_path}"
         )
 
+    @staticmethod
+    def _send_flutter_command(stdin, command: bytes) -> bool:
+        """
+        Write a key command straight to the flutter process stdin pipe, bypassing the text wrapper.
+        Returns False if the pipe stays full because flutter is not reading its input.
+        """
+        fd = stdin.fileno()
+        try:
+            os.write(fd, command)
+        except BlockingIOError:
+            _, writable, _ = select.select([], [fd], [], 0.1)
+            if not writable:
+                return False
+            try:
+                os.write(fd, command)
+            except BlockingIOError:
+                return False
+        return True
+
     def hot_reload_flutter_run(self) -> str:
         """Send hot reload command (`r`) to the managed flutter run process."""
-        if not self.flutter_process or self.flutter_process.poll() is not None:
+        proc = self.flutter_process
+        if not proc or proc.poll() is not None:
             return "No active flutter run process. Start one with start_flutter_run first."
 
-        if not self.flutter_process.stdin:
+        if not proc.stdin:
             return "Flutter process stdin is unavailable; cannot send hot reload command."
 
-        self.flutter_process.stdin.write("r\n")
-        self.flutter_process.stdin.flush()
+        if not self._send_flutter_command(proc.stdin, b"r\n"):
+            return "Flutter process is not reading stdin; hot reload command was not sent."
         return "Hot reload command sent to flutter run."
 
     def hot_restart_flutter_run(self) -> str:
         """Send hot restart command (`R`) to the managed flutter run process."""
-        if not self.flutter_process or self.flutter_process.poll() is not None:
+        proc = self.flutter_process
+        if not proc or proc.poll() is not None:
             return "No active flutter run process. Start one with start_flutter_run first."
 
-        if not self.flutter_process.stdin:
+        if not proc.stdin:
             return "Flutter process stdin is unavailable; cannot send hot restart command."
 
-        self.flutter_process.stdin.write("R\n")
-        self.flutter_process.stdin.flush()
+        if not self._send_flutter_command(proc.stdin, b"R\n"):
+            return "Flutter process is not reading stdin; hot restart command was not sent."
         return "Hot restart command sent to flutter run."
 
     def stop_flutter_run(self, graceful_wait_seconds: int = 10) -> str:
         """Stop the managed flutter run process, trying graceful quit first."""
-        if not self.flutter_process or self.flutter_process.poll() is not None:
+        proc = self.flutter_process
+        if not proc or proc.poll() is not None:
             self._cleanup_flutter_process_state()
             return "No active flutter run process."
 
-        pid = self.flutter_process.pid
-        if self.flutter_process.stdin:
-            self.flutter_process.stdin.write("q\n")
-            self.flutter_process.stdin.flush()
-
+        pid = proc.pid
+        # Open the pidfd up front so the graceful and kill waits share it.
+        pidfd = self._open_pidfd(pid)
         try:
-            self.flutter_process.wait(timeout=max(1, graceful_wait_seconds))
-            stopped_gracefully = True
-        except subprocess.TimeoutExpired:
-            self.flutter_process.kill()
-            self.flutter_process.wait(timeout=5)
-            stopped_gracefully = False
+            if proc.stdin:
+                self._send_flutter_command(proc.stdin, b"q\n")
+
+            stopped_gracefully = self._wait_for_exit(
+                proc, max(1, graceful_wait_seconds), pidfd
+            )
+            if not stopped_gracefully:
+                proc.kill()
+                killed = self._wait_for_exit(proc, 5, pidfd)
+        finally:
+            if pidfd is not None:
+                os.close(pidfd)
+
+        if not stopped_gracefully and not killed:
+            # Keep tracking the process so a later stop can reap it.
+            return (
+                f"Sent kill to flutter run process (pid: {pid}) but it had not exited "
+                "after 5 seconds; it is still tracked."
+            )
 
         self._cleanup_flutter_process_state()
         if stopped_gracefully:
@@ -305,17 +585,19 @@ class AdbDeviceManager:
 
     def get_flutter_run_log(self, lines: int = 60) -> str:
         """Read the tail of the managed flutter run log file."""
-        if not self.flutter_log_path:
+        log_path = self.flutter_log_path
+        if not log_path:
             return "No flutter log available yet. Start flutter run first."
 
-        if self._flutter_log_handle and not self._flutter_log_handle.closed:
-            self._flutter_log_handle.flush()
+        log_handle = self._flutter_log_handle
+        if log_handle and not log_handle.closed:
+            log_handle.flush()
 
-        return self._tail_file(self.flutter_log_path, lines=max(1, lines))
+        return self._tail_file(log_path, lines=max(1, lines), drop_cached_prefix=True)
 
     def _read_pid_logcat(self, package_name: str) -> str | None:
         """Read logcat lines scoped to a package PID."""
-        pid_output = self.device.shell(f"pidof {package_name}").strip()
+        pid_output = self._shell(f"pidof {package_name}").strip()
         if not pid_output:
             return None
 
@@ -471,7 +753,7 @@ class AdbDeviceManager:
             command.extend(["--debug-port", str(debug_port)])
 
         if additional_args:
-            command.extend(shlex.split(additional_args, posix=os.name != "nt"))
+            command.extend(_split_args(additional_args, posix=os.name != "nt"))
 
         attach_log_path = os.path.join(project_dir, ".mcp_flutter_attach.log")
         with open(attach_log_path, "w", encoding="utf-8") as log_handle:
@@ -620,15 +902,24 @@ class AdbDeviceManager:
             action_wait_seconds=action_wait_seconds,
         )
 
+    def _capture_screenshot_bytes(self) -> bytes:
+        """Stream a full-resolution PNG screenshot from the device via `adb exec-out`."""
+        result = subprocess.run(
+            ["adb", "-s", self.device_serial, "exec-out", "screencap", "-p"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=False,
+        )
+        if result.returncode != 0 or not result.stdout:
+            stderr = result.stderr.decode("utf-8", errors="replace").strip()
+            raise RuntimeError(f"screencap failed: {stderr or 'no image data returned'}")
+        return result.stdout
+
     def _capture_raw_screenshot(self, output_path: str) -> None:
         """Capture a full-resolution screenshot from the device."""
         host_path = Path(output_path)
         host_path.parent.mkdir(parents=True, exist_ok=True)
-
-        device_path = "/sdcard/mcp_screenshot.png"
-        self.device.shell(f"screencap -p {device_path}")
-        self.device.pull(device_path, str(host_path))
-        self.device.shell(f"rm {device_path}")
+        host_path.write_bytes(self._capture_screenshot_bytes())
 
     def _download_binary_file(self, url: str, output_path: str, headers: dict[str, str] | None = None) -> None:
         req = urlrequest.Request(url, headers=headers or {})
@@ -920,55 +1211,65 @@ class AdbDeviceManager:
         }
 
     def take_screenshot(self) -> None:
-        self._capture_raw_screenshot("screenshot.png")
+        raw = self._capture_screenshot_bytes()
 
         # Compress screenshot to avoid client-side payload issues.
-        with PILImage.open("screenshot.png") as img:
-            width, height = img.size
-            new_width = int(width * 0.3)
-            new_height = int(height * 0.3)
-            resized_img = img.resize((new_width, new_height), PILImage.Resampling.LANCZOS)
-            resized_img.save("compressed_screenshot.png", "PNG", quality=85, optimize=True)
+        # Integer box reduction is much cheaper than a LANCZOS resample, and
+        # a low zlib level keeps PNG encoding fast.
+        with PILImage.open(io.BytesIO(raw)) as img:
+            resized_img = img.reduce(3)
+            resized_img.save("compressed_screenshot.png", "PNG", compress_level=3)
+
+    def _dump_ui_hierarchy(self) -> bytes:
+        """Stream the uiautomator window dump from the device via `adb exec-out`."""
+        result = subprocess.run(
+            ["adb", "-s", self.device_serial, "exec-out", "uiautomator", "dump", "/dev/tty"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=False,
+        )
+        # uiautomator appends a "UI hierchary dumped to: /dev/tty" line after the XML.
+        start = result.stdout.find(b"<hierarchy")
+        end = result.stdout.rfind(b"</hierarchy>")
+        if result.returncode != 0 or start == -1 or end == -1:
+            output = (result.stdout + result.stderr).decode("utf-8", errors="replace").strip()
+            raise RuntimeError(f"uiautomator dump failed: {output or 'no output'}")
+        return result.stdout[start:end + len(b"</hierarchy>")]
 
     def get_uilayout(self) -> str:
-        self.device.shell("uiautomator dump")
-        self.device.pull("/sdcard/window_dump.xml", "window_dump.xml")
-        self.device.shell("rm /sdcard/window_dump.xml")
-
-        import re
-        import xml.etree.ElementTree as ET
-
-        def calculate_center(bounds_str):
-            matches = re.findall(r"\[(\d+),(\d+)\]", bounds_str)
-            if len(matches) == 2:
-                x1, y1 = map(int, matches[0])
-                x2, y2 = map(int, matches[1])
-                center_x = (x1 + x2) // 2
-                center_y = (y1 + y2) // 2
-                return center_x, center_y
-            return None
-
-        tree = ET.parse("window_dump.xml")
-        root = tree.getroot()
+        xml_bytes = self._dump_ui_hierarchy()
 
         clickable_elements = []
-        for element in root.findall(".//node[@clickable='true']"):
+        # Stream the dump and discard finished nodes so memory stays bounded on
+        # complex screens. Nodes are read on "start" to keep document order.
+        for event, element in etree.iterparse(
+            io.BytesIO(xml_bytes), events=("start", "end"), tag="node"
+        ):
+            if event == "end":
+                element.clear(keep_tail=True)
+                while element.getprevious() is not None:
+                    del element.getparent()[0]
+                continue
+
+            if element.get("clickable") != "true":
+                continue
             text = element.get("text", "")
             content_desc = element.get("content-desc", "")
-            bounds = element.get("bounds", "")
-
             # Only include elements that have either text or content description
-            if text or content_desc:
-                center = calculate_center(bounds)
-                element_info = "Clickable element:"
-                if text:
-                    element_info += f"\n  Text: {text}"
-                if content_desc:
-                    element_info += f"\n  Description: {content_desc}"
-                element_info += f"\n  Bounds: {bounds}"
-                if center:
-                    element_info += f"\n  Center: ({center[0]}, {center[1]})"
-                clickable_elements.append(element_info)
+            if not (text or content_desc):
+                continue
+
+            bounds = element.get("bounds", "")
+            center = _bounds_center(bounds)
+            element_info = "Clickable element:"
+            if text:
+                element_info += f"\n  Text: {text}"
+            if content_desc:
+                element_info += f"\n  Description: {content_desc}"
+            element_info += f"\n  Bounds: {bounds}"
+            if center:
+                element_info += f"\n  Center: ({center[0]}, {center[1]})"
+            clickable_elements.append(element_info)
 
         if not clickable_elements:
             return "No clickable elements found with text or description"
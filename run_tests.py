@@ -48,7 +48,7 @@ def main():
         return 1
 
     # Run tests with coverage
-    if not run_command("pytest tests/ -v --cov=. --cov-report=term-missing", "Running tests with coverage"):
+    if not run_command("pytest tests/ -v -n auto --cov=. --cov-report=term-missing", "Running tests with coverage"):
         print("Tests failed")
         return 1
 
@@ -1,3 +1,4 @@
+import asyncio
 import os
 import sys
 
@@ -45,7 +46,13 @@ else:
 # Initialize MCP and device manager
 # AdbDeviceManager will handle auto-selection if device_name is None
 mcp = FastMCP("android")
-deviceManager = AdbDeviceManager(device_name)
+deviceManager = AdbDeviceManager(device_name, persistent_shell=True)
+
+# Long-running flutter tools block on process waits, so they run in worker
+# threads to keep the event loop serving other tool calls. Every tool touching
+# the managed flutter run holds this lock, so none of them sees the process
+# state while another is starting or stopping it.
+flutter_run_lock = asyncio.Lock()
 
 
 @mcp.tool()
@@ -71,6 +78,17 @@ def execute_adb_shell_command(command: str) -> str:
     return result
 
 
+@mcp.tool()
+def execute_adb_shell_commands(commands: list[str]) -> str:
+    """Executes several ADB shell commands in one round-trip and returns their combined output.
+    Args:
+        commands (list[str]): The ADB shell commands to execute, in order
+    Returns:
+        str: The combined output of the commands
+    """
+    return deviceManager.shell_batch(commands)
+
+
 @mcp.tool()
 def get_uilayout() -> str:
     """
@@ -127,7 +145,7 @@ def launch_app(package_name: str, activity_name: str | None = None, stop_first:
 
 
 @mcp.tool()
-def start_flutter_run(
+async def start_flutter_run(
     project_dir: str,
     target: str = "lib/main.dart",
     flutter_executable: str = "flutter",
@@ -145,37 +163,41 @@ def start_flutter_run(
     Returns:
         str: Startup status and log location
     """
-    return deviceManager.start_flutter_run(
-        project_dir=project_dir,
-        target=target,
-        flutter_executable=flutter_executable,
-        additional_args=additional_args,
-        startup_wait_seconds=startup_wait_seconds,
-    )
+    async with flutter_run_lock:
+        return await asyncio.to_thread(
+            deviceManager.start_flutter_run,
+            project_dir=project_dir,
+            target=target,
+            flutter_executable=flutter_executable,
+            additional_args=additional_args,
+            startup_wait_seconds=startup_wait_seconds,
+        )
 
 
 @mcp.tool()
-def hot_reload_flutter_run() -> str:
+async def hot_reload_flutter_run() -> str:
     """
     Trigger hot reload for the managed flutter run process.
     Returns:
         str: Operation status
     """
-    return deviceManager.hot_reload_flutter_run()
+    async with flutter_run_lock:
+        return await asyncio.to_thread(deviceManager.hot_reload_flutter_run)
 
 
 @mcp.tool()
-def hot_restart_flutter_run() -> str:
+async def hot_restart_flutter_run() -> str:
     """
     Trigger hot restart for the managed flutter run process.
     Returns:
         str: Operation status
     """
-    return deviceManager.hot_restart_flutter_run()
+    async with flutter_run_lock:
+        return await asyncio.to_thread(deviceManager.hot_restart_flutter_run)
 
 
 @mcp.tool()
-def stop_flutter_run(graceful_wait_seconds: int = 10) -> str:
+async def stop_flutter_run(graceful_wait_seconds: int = 10) -> str:
     """
     Stop the managed flutter run process started by start_flutter_run.
     Args:
@@ -183,11 +205,15 @@ def stop_flutter_run(graceful_wait_seconds: int = 10) -> str:
     Returns:
         str: Stop status
     """
-    return deviceManager.stop_flutter_run(graceful_wait_seconds=graceful_wait_seconds)
+    async with flutter_run_lock:
+        return await asyncio.to_thread(
+            deviceManager.stop_flutter_run,
+            graceful_wait_seconds=graceful_wait_seconds,
+        )
 
 
 @mcp.tool()
-def get_flutter_run_log(lines: int = 60) -> str:
+async def get_flutter_run_log(lines: int = 60) -> str:
     """
     Read the tail of the managed flutter run log.
     Args:
@@ -195,11 +221,12 @@ def get_flutter_run_log(lines: int = 60) -> str:
     Returns:
         str: Log tail
     """
-    return deviceManager.get_flutter_run_log(lines=lines)
+    async with flutter_run_lock:
+        return await asyncio.to_thread(deviceManager.get_flutter_run_log, lines=lines)
 
 
 @mcp.tool()
-def hot_reload_vscode_session(
+async def hot_reload_vscode_session(
     project_dir: str,
     package_name: str,
     target: str = "lib/main.dart",
@@ -227,7 +254,8 @@ def hot_reload_vscode_session(
     Returns:
         str: Attach/reload outcome and log tail
     """
-    return deviceManager.hot_reload_vscode_session(
+    return await asyncio.to_thread(
+        deviceManager.hot_reload_vscode_session,
         project_dir=project_dir,
         package_name=package_name,
         target=target,
@@ -241,7 +269,7 @@ def hot_reload_vscode_session(
 
 
 @mcp.tool()
-def hot_restart_vscode_session(
+async def hot_restart_vscode_session(
     project_dir: str,
     package_name: str,
     target: str = "lib/main.dart",
@@ -269,7 +297,8 @@ def hot_restart_vscode_session(
     Returns:
         str: Attach/restart outcome and log tail
     """
-    return deviceManager.hot_restart_vscode_session(
+    return await asyncio.to_thread(
+        deviceManager.hot_restart_vscode_session,
         project_dir=project_dir,
         package_name=package_name,
         target=target,
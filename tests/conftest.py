@@ -0,0 +1,75 @@
+"""
+Shared fixtures for the Android MCP Server tests
+"""
+
+from unittest.mock import Mock, create_autospec, patch
+
+import pytest
+from ppadb.client import Client as AdbClient
+
+from adbdevicemanager import AdbDeviceManager
+
+_DEVICE_DEFAULTS = {"shell.return_value": ""}
+
+
+def _new_device() -> Mock:
+    return Mock(spec_set=["shell", "pull"], **_DEVICE_DEFAULTS)
+
+
+def _start_manager_patches():
+    """
+    Start fresh patches for what AdbDeviceManager.__init__ talks to.
+
+    Returns the started patchers and their (check_adb_installed,
+    get_available_devices, adb_client) mocks.
+    """
+    patchers = [
+        patch("adbdevicemanager.AdbDeviceManager.check_adb_installed"),
+        patch("adbdevicemanager.AdbDeviceManager.get_available_devices"),
+        # Spec from the ppadb class, not the module attribute, which may already
+        # be patched when a test nests these patches.
+        patch("adbdevicemanager._ADB_CLIENT", create_autospec(AdbClient, instance=True)),
+    ]
+    started = []
+    try:
+        mocks = []
+        for patcher in patchers:
+            mocks.append(patcher.start())
+            started.append(patcher)
+    except BaseException:
+        _stop_manager_patches(started)
+        raise
+    return started, tuple(mocks)
+
+
+def _stop_manager_patches(patchers):
+    for patcher in reversed(patchers):
+        patcher.stop()
+
+
+@pytest.fixture
+def manager_patches():
+    """
+    Patch what AdbDeviceManager.__init__ talks to.
+
+    Yields (check_adb_installed, get_available_devices, adb_client) mocks.
+    """
+    patchers, mocks = _start_manager_patches()
+    yield mocks
+    _stop_manager_patches(patchers)
+
+
+@pytest.fixture
+def single_device_manager():
+    """Yield (manager, mock_device) for the auto-selected "device123"."""
+    mock_device = _new_device()
+    patchers, (mock_check_adb, mock_get_devices, mock_adb_client) = _start_manager_patches()
+    try:
+        mock_check_adb.return_value = True
+        mock_get_devices.return_value = ["device123"]
+        mock_adb_client.device.return_value = mock_device
+        manager = AdbDeviceManager(
+            device_name=None, exit_on_error=False, log_fn=lambda *args, **kwargs: None)
+    finally:
+        _stop_manager_patches(patchers)
+    yield manager, mock_device
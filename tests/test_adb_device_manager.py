@@ -2,188 +2,474 @@
 Tests for AdbDeviceManager
 """
 
+import io
 import os
+import re
+import shlex
+import subprocess
 import sys
+from dataclasses import dataclass
 from pathlib import Path
-from unittest.mock import MagicMock, patch
+from types import SimpleNamespace
+from typing import BinaryIO
+from unittest.mock import ANY, MagicMock, Mock, patch
 
 import pytest
 from PIL import Image as PILImage
 
 from adbdevicemanager import AdbDeviceManager
 
-# Add the parent directory to the path so we can import our modules
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+UI_DUMP_XML = """<?xml version='1.0' encoding='UTF-8' standalone='yes' ?>
+<hierarchy rotation="0">
+  <node text="" content-desc="" clickable="false" bounds="[0,0][1080,1920]">
+    <node text="Sign in" content-desc="" clickable="true" bounds="[0,100][200,300]" />
+    <node text="" content-desc="" clickable="true" bounds="[0,300][200,400]" />
+    <node text="Title" content-desc="" clickable="false" bounds="[0,0][200,100]" />
+    <node text="" content-desc="Back" clickable="true" bounds="[10,10][50,50]" />
+    <node text="Card" content-desc="" clickable="true" bounds="[0,500][400,700]">
+      <node text="Open" content-desc="" clickable="true" bounds="[300,600][400,700]" />
+    </node>
+  </node>
+</hierarchy>
+"""
+
+
+DUMPSYS_PACKAGE_OUTPUT = """Activity Resolver Table:
+  Schemes:
+      https:
+        a1b2c3 com.example.app/.LinkActivity filter d4e5f6
+
+  Non-Data Actions:
+      android.intent.action.MAIN:
+        a1b2c3 com.example.app/.MainActivity filter 0f0f0f
+          Action: "android.intent.action.MAIN"
+      com.example.app.action.SYNC:
+        a1b2c3 com.example.app/.SyncActivity filter 1e1e1e
+
+Receiver Resolver Table:
+  Non-Data Actions:
+      android.intent.action.BOOT_COMPLETED:
+        a1b2c3 com.example.app/.BootReceiver filter 2d2d2d
+"""
+
+
+_MULTIPLE_DEVICES_RE = re.compile(r"Multiple devices connected: .*device123.*device456")
+_DEVICE_NOT_FOUND_RE = re.compile(r"Device non-existent-device not found\. Available devices")
+_NO_DEVICES_RE = re.compile(r"No devices connected")
+_ADB_NOT_INSTALLED_RE = re.compile(r"adb is not installed")
+
+
+@dataclass
+class _FakePopen:
+    """Stand-in for a running `subprocess.Popen`; give it a real pipe as stdin."""
+    args: list[str] | None = None
+    pid: int = 999
+    returncode: int | None = None
+    stdin: BinaryIO | None = None
+
+    def poll(self) -> int | None:
+        return self.returncode
+
+
+@pytest.fixture
+def flutter_env(monkeypatch, single_device_manager):
+    """
+    Resolve `flutter` to /usr/bin/flutter, skip startup waits and make Popen
+    return one _FakePopen, whose stdin is a real pipe, recording the argv it got.
+
+    pidfds are reported unavailable so the startup wait never touches whatever
+    real process happens to own the fake pid; it falls back to the no-op sleep.
+    On teardown the manager's flutter run state, including its log file, is
+    released.
+    """
+    read_fd, write_fd = os.pipe()
+    fake_proc = _FakePopen(stdin=os.fdopen(write_fd, "wb"))
+
+    def fake_popen(args, *_args, **_kwargs):
+        fake_proc.args = args
+        return fake_proc
+
+    monkeypatch.setattr("adbdevicemanager.shutil.which", lambda _name: "/usr/bin/flutter")
+    monkeypatch.setattr(
+        "adbdevicemanager.AdbDeviceManager._open_pidfd", staticmethod(lambda _pid: None))
+    monkeypatch.setattr("adbdevicemanager.time.sleep", lambda _seconds: None)
+    monkeypatch.setattr("adbdevicemanager.subprocess.Popen", fake_popen)
+    yield fake_proc
+    manager, _ = single_device_manager
+    manager._cleanup_flutter_process_state()
+    fake_proc.stdin.close()
+    os.close(read_fd)
+
+
+def _reap_session(proc: subprocess.Popen) -> None:
+    if proc.poll() is None:
+        proc.kill()
+    proc.wait()
+    for pipe in (proc.stdin, proc.stdout):
+        try:
+            pipe.close()
+        except OSError:
+            pass
+
+
+@pytest.fixture
+def clear_adb_check_cache():
+    """Clear the check_adb_installed cache before and after the test."""
+    AdbDeviceManager.check_adb_installed.cache_clear()
+    yield
+    AdbDeviceManager.check_adb_installed.cache_clear()
+
+
+@pytest.fixture
+def local_sh_session():
+    """
+    Return a spawner for local `sh` processes that stand in for `adb shell`.
+    Every process it spawned is reaped and its pipes closed on teardown.
+    """
+    spawned = []
+
+    def spawn():
+        proc = subprocess.Popen(
+            ["sh"], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        spawned.append(proc)
+        return proc
+
+    yield spawn
+    for proc in spawned:
+        _reap_session(proc)
+
+
+@pytest.fixture
+def dead_adb_session():
+    """
+    Return a factory for an `adb shell` stand-in that printed `output` and has
+    already exited. Its pipes are closed on teardown.
+    """
+    spawned = []
+
+    def build(output: str = ""):
+        proc = subprocess.Popen(
+            [sys.executable, "-c", f"print({output!r}, end='')"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        proc.wait()
+        spawned.append(proc)
+        return proc
+
+    yield build
+    for proc in spawned:
+        _reap_session(proc)
 
 
 class TestAdbDeviceManager:
     """Test AdbDeviceManager functionality"""
 
-    @patch('adbdevicemanager.AdbDeviceManager.check_adb_installed')
-    @patch('adbdevicemanager.AdbDeviceManager.get_available_devices')
-    @patch('adbdevicemanager.AdbClient')
-    def test_single_device_auto_selection(self, mock_adb_client, mock_get_devices, mock_check_adb):
+    def test_single_device_auto_selection(self, manager_patches):
         """Test auto-selection when only one device is connected"""
+        mock_check_adb, mock_get_devices, mock_adb_client = manager_patches
+
         # Setup mocks
         mock_check_adb.return_value = True
         mock_get_devices.return_value = ["device123"]
-        mock_device = MagicMock()
-        mock_adb_client.return_value.device.return_value = mock_device
+        mock_device = SimpleNamespace(serial="device123")
+        mock_adb_client.device.return_value = mock_device
 
         # Test with device_name=None (auto-selection)
-        with patch('builtins.print') as mock_print:
-            manager = AdbDeviceManager(device_name=None, exit_on_error=False)
-
-            # Verify the correct device was selected
-            mock_adb_client.return_value.device.assert_called_once_with(
-                "device123")
-            assert manager.device == mock_device
-
-            # Verify auto-selection message was printed
-            mock_print.assert_called_with(
-                "No device specified, automatically selected: device123")
-
-    @patch('adbdevicemanager.AdbDeviceManager.check_adb_installed')
-    @patch('adbdevicemanager.AdbDeviceManager.get_available_devices')
-    def test_multiple_devices_no_selection_error(self, mock_get_devices, mock_check_adb):
-        """Test error when multiple devices are connected but none specified"""
-        # Setup mocks
-        mock_check_adb.return_value = True
-        mock_get_devices.return_value = ["device123", "device456"]
+        mock_log = MagicMock()
+        manager = AdbDeviceManager(
+            device_name=None, exit_on_error=False, log_fn=mock_log)
 
-        # Test with device_name=None and multiple devices
-        with pytest.raises(RuntimeError) as exc_info:
-            AdbDeviceManager(device_name=None, exit_on_error=False)
+        # Verify the correct device was selected
+        mock_adb_client.device.assert_called_once_with(
+            "device123")
+        assert manager.device == mock_device
 
-        assert "Multiple devices connected" in str(exc_info.value)
-        assert "device123" in str(exc_info.value)
-        assert "device456" in str(exc_info.value)
+        # Verify auto-selection message was logged
+        mock_log.assert_called_with(
+            "No device specified, automatically selected: device123")
 
-    @patch('adbdevicemanager.AdbDeviceManager.check_adb_installed')
-    @patch('adbdevicemanager.AdbDeviceManager.get_available_devices')
-    @patch('adbdevicemanager.AdbClient')
-    def test_specific_device_selection(self, mock_adb_client, mock_get_devices, mock_check_adb):
+    def test_specific_device_selection(self, manager_patches):
         """Test selecting a specific device"""
+        mock_check_adb, mock_get_devices, mock_adb_client = manager_patches
+
         # Setup mocks
         mock_check_adb.return_value = True
         mock_get_devices.return_value = ["device123", "device456"]
-        mock_device = MagicMock()
-        mock_adb_client.return_value.device.return_value = mock_device
+        mock_device = SimpleNamespace(serial="device456")
+        mock_adb_client.device.return_value = mock_device
 
         # Test with specific device name
         manager = AdbDeviceManager(
             device_name="device456", exit_on_error=False)
 
         # Verify the correct device was selected
-        mock_adb_client.return_value.device.assert_called_once_with(
+        mock_adb_client.device.assert_called_once_with(
             "device456")
         assert manager.device == mock_device
 
-    @patch('adbdevicemanager.AdbDeviceManager.check_adb_installed')
-    @patch('adbdevicemanager.AdbDeviceManager.get_available_devices')
-    def test_device_not_found_error(self, mock_get_devices, mock_check_adb):
-        """Test error when specified device is not found"""
-        # Setup mocks
-        mock_check_adb.return_value = True
-        mock_get_devices.return_value = ["device123", "device456"]
+    @pytest.mark.parametrize(
+        "adb_installed,devices,device_name,expected",
+        [
+            (True, ["device123", "device456"], None, _MULTIPLE_DEVICES_RE),
+            (True, ["device123", "device456"], "non-existent-device", _DEVICE_NOT_FOUND_RE),
+            (True, [], None, _NO_DEVICES_RE),
+            (False, [], None, _ADB_NOT_INSTALLED_RE),
+        ],
+        ids=["multiple-devices", "device-not-found", "no-devices", "adb-not-installed"],
+    )
+    def test_device_selection_errors(
+        self, adb_installed, devices, device_name, expected, manager_patches):
+        """Test RuntimeError is raised when no usable device can be selected"""
+        mock_check_adb, mock_get_devices, _ = manager_patches
+
+        mock_check_adb.return_value = adb_installed
+        mock_get_devices.return_value = devices
 
-        # Test with non-existent device
         with pytest.raises(RuntimeError) as exc_info:
-            AdbDeviceManager(device_name="non-existent-device",
-                             exit_on_error=False)
+            AdbDeviceManager(device_name=device_name, exit_on_error=False)
 
-        assert "Device non-existent-device not found" in str(exc_info.value)
-        assert "Available devices" in str(exc_info.value)
+        assert expected.search(str(exc_info.value))
 
-    @patch('adbdevicemanager.AdbDeviceManager.check_adb_installed')
-    @patch('adbdevicemanager.AdbDeviceManager.get_available_devices')
-    def test_no_devices_connected_error(self, mock_get_devices, mock_check_adb):
-        """Test error when no devices are connected"""
-        # Setup mocks
-        mock_check_adb.return_value = True
-        mock_get_devices.return_value = []
+    @patch('adbdevicemanager.shutil.which')
+    def test_check_adb_installed_success(self, mock_which, clear_adb_check_cache):
+        """Test successful ADB installation check"""
+        mock_which.return_value = "/usr/bin/adb"
 
-        # Test with no devices
-        with pytest.raises(RuntimeError) as exc_info:
-            AdbDeviceManager(device_name=None, exit_on_error=False)
+        result = AdbDeviceManager.check_adb_installed()
 
-        assert "No devices connected" in str(exc_info.value)
+        assert result is True
+        mock_which.assert_called_once_with("adb")
 
-    @patch('adbdevicemanager.AdbDeviceManager.check_adb_installed')
-    def test_adb_not_installed_error(self, mock_check_adb):
-        """Test error when ADB is not installed"""
-        # Setup mocks
-        mock_check_adb.return_value = False
+    @patch('adbdevicemanager.shutil.which')
+    def test_check_adb_installed_failure(self, mock_which, clear_adb_check_cache):
+        """Test failed ADB installation check"""
+        mock_which.return_value = None  # ADB not found
 
-        # Test with ADB not installed
-        with pytest.raises(RuntimeError) as exc_info:
-            AdbDeviceManager(device_name=None, exit_on_error=False)
+        result = AdbDeviceManager.check_adb_installed()
 
-        assert "adb is not installed" in str(exc_info.value)
+        assert result is False
 
-    @patch('subprocess.run')
-    def test_check_adb_installed_success(self, mock_run):
-        """Test successful ADB installation check"""
-        mock_run.return_value = MagicMock()  # Successful run
+    @patch('adbdevicemanager.shutil.which')
+    def test_check_adb_installed_is_cached(self, mock_which, clear_adb_check_cache):
+        """Test the ADB lookup runs once per process"""
+        mock_which.return_value = "/usr/bin/adb"
 
-        result = AdbDeviceManager.check_adb_installed()
+        assert AdbDeviceManager.check_adb_installed() is True
+        assert AdbDeviceManager.check_adb_installed() is True
+
+        mock_which.assert_called_once()
+
+    @patch('adbdevicemanager.shutil.which')
+    def test_check_adb_installed_verify_working_success(
+        self,
+        mock_which,
+        fp,
+        clear_adb_check_cache,
+    ):
+        """Test explicit health check runs `adb version`"""
+        mock_which.return_value = "/usr/bin/adb"
+        fp.register(["adb", "version"], stdout="Android Debug Bridge version 1.0.41")
+
+        result = AdbDeviceManager.check_adb_installed(verify_working=True)
 
         assert result is True
-        mock_run.assert_called_once()
+        assert fp.call_count(["adb", "version"]) == 1
 
-    @patch('subprocess.run')
-    def test_check_adb_installed_failure(self, mock_run):
-        """Test failed ADB installation check"""
-        mock_run.side_effect = FileNotFoundError()  # ADB not found
+    @patch('adbdevicemanager.shutil.which')
+    def test_check_adb_installed_verify_working_failure(
+        self,
+        mock_which,
+        fp,
+        clear_adb_check_cache,
+    ):
+        """Test explicit health check reports a failing `adb version`"""
+        mock_which.return_value = "/usr/bin/adb"
+        fp.register(["adb", "version"], returncode=1)
 
-        result = AdbDeviceManager.check_adb_installed()
+        result = AdbDeviceManager.check_adb_installed(verify_working=True)
+
+        assert result is False
+        assert fp.call_count(["adb", "version"]) == 1
+
+    @patch('adbdevicemanager.shutil.which')
+    def test_check_adb_installed_verify_working_not_executable(
+        self,
+        mock_which,
+        fp,
+        clear_adb_check_cache,
+    ):
+        """Test explicit health check reports an `adb` that cannot be executed"""
+        def raise_not_found(_process):
+            raise FileNotFoundError()
+
+        mock_which.return_value = "/usr/bin/adb"
+        fp.register(["adb", "version"], callback=raise_not_found)
+
+        result = AdbDeviceManager.check_adb_installed(verify_working=True)
 
         assert result is False
 
-    @patch('adbdevicemanager.AdbClient')
+    @patch('adbdevicemanager._ADB_CLIENT', autospec=True)
     def test_get_available_devices(self, mock_adb_client):
         """Test getting available devices"""
         # Setup mock devices
-        mock_device1 = MagicMock()
-        mock_device1.serial = "device123"
-        mock_device2 = MagicMock()
-        mock_device2.serial = "device456"
+        mock_device1 = SimpleNamespace(serial="device123")
+        mock_device2 = SimpleNamespace(serial="device456")
 
-        mock_adb_client.return_value.devices.return_value = [
+        mock_adb_client.devices.return_value = [
             mock_device1, mock_device2]
 
         devices = AdbDeviceManager.get_available_devices()
 
         assert devices == ["device123", "device456"]
 
-    @patch('adbdevicemanager.AdbDeviceManager.check_adb_installed')
-    @patch('adbdevicemanager.AdbDeviceManager.get_available_devices')
-    @patch('adbdevicemanager.AdbClient')
-    def test_exit_on_error_true(self, mock_adb_client, mock_get_devices, mock_check_adb):
+    def test_exit_on_error_true(self, manager_patches):
         """Test that exit_on_error=True calls sys.exit"""
+        mock_check_adb, mock_get_devices, _ = manager_patches
+
         # Setup mocks to trigger error
         mock_check_adb.return_value = True
         mock_get_devices.return_value = []  # No devices
 
         # Test with exit_on_error=True (default)
+        mock_log = MagicMock()
         with patch('sys.exit') as mock_exit:
-            with patch('builtins.print'):  # Suppress error output
-                AdbDeviceManager(device_name=None, exit_on_error=True)
+            AdbDeviceManager(device_name=None, exit_on_error=True, log_fn=mock_log)
 
             mock_exit.assert_called_once_with(1)
+        mock_log.assert_any_call(
+            "No devices connected. Please connect a device and try again.", file=sys.stderr)
+
+    def test_get_packages_strips_package_prefix(self, single_device_manager):
+        """Test package list output is returned without the `package:` prefixes."""
+        manager, mock_device = single_device_manager
+
+        def fake_shell(_command, handler):
+            connection = MagicMock(**{"read_all.return_value": bytearray(
+                b"package:com.android.settings\npackage:com.example.app\n")})
+            handler(connection)
+
+        mock_device.shell.side_effect = fake_shell
+
+        assert manager.get_packages() == "com.android.settings\ncom.example.app"
+        mock_device.shell.assert_called_once_with("pm list packages", handler=ANY)
+
+    def test_get_package_action_intents_reads_non_data_actions(self, single_device_manager):
+        """Test only Non-Data Actions from the Activity Resolver Table are returned."""
+        manager, mock_device = single_device_manager
+        mock_device.shell.return_value = DUMPSYS_PACKAGE_OUTPUT
+
+        assert manager.get_package_action_intents("com.example.app") == [
+            "android.intent.action.MAIN:",
+            "com.example.app.action.SYNC:",
+        ]
+
+    @pytest.mark.skipif(os.name == "nt", reason="uses a local POSIX sh as the adb shell")
+    def test_persistent_shell_reuses_one_session(self, single_device_manager, local_sh_session):
+        """Test shell commands share one long-lived session and keep their exact output."""
+        manager, mock_device = single_device_manager
+        manager.persistent_shell = True
+
+        with patch.object(
+            manager, "_spawn_shell_session", side_effect=local_sh_session
+        ) as mock_spawn:
+            first = manager.execute_adb_shell_command("adb shell echo 'it''s'; echo err >&2")
+            second = manager.execute_adb_shell_command("printf 'no newline'")
+            unbalanced = manager.execute_adb_shell_command("echo 'oops")
+            after_error = manager.execute_adb_shell_command("cat; echo done")
+
+        assert first == "its\nerr\n"
+        assert second == "no newline"
+        assert unbalanced
+        assert after_error == "done\n"
+        mock_spawn.assert_called_once()
+        mock_device.shell.assert_not_called()
+
+    @patch('adbdevicemanager.subprocess.Popen')
+    def test_persistent_shell_falls_back_when_adb_cannot_start(
+        self,
+        mock_popen,
+        single_device_manager,
+    ):
+        """Test shell commands fall back to ppadb when the session cannot be spawned."""
+        manager, mock_device = single_device_manager
+        mock_device.shell.return_value = "ok"
+        mock_popen.side_effect = FileNotFoundError()
+        manager.persistent_shell = True
+        manager._log = MagicMock()
+
+        result = manager.execute_adb_shell_command("echo ok")
+
+        assert result == "ok"
+        assert manager.persistent_shell is False
+        mock_device.shell.assert_called_once_with("echo ok")
+
+    def test_persistent_shell_reports_adb_diagnostic(
+        self,
+        single_device_manager,
+        dead_adb_session,
+    ):
+        """Test adb's own error output is kept when the session dies mid-command."""
+        manager, mock_device = single_device_manager
+        manager.persistent_shell = True
+        fake_adb = dead_adb_session("error: device offline\n")
+
+        with patch.object(manager, "_spawn_shell_session", return_value=fake_adb):
+            with pytest.raises(RuntimeError, match="error: device offline"):
+                manager.execute_adb_shell_command("echo ok")
+
+        mock_device.shell.assert_not_called()
+
+    def test_persistent_shell_falls_back_when_session_exits_silently(
+        self,
+        single_device_manager,
+        dead_adb_session,
+    ):
+        """Test shell commands fall back to ppadb when the session exits without output."""
+        manager, mock_device = single_device_manager
+        mock_device.shell.return_value = "ok"
+        manager.persistent_shell = True
+        manager._log = MagicMock()
+        fake_adb = dead_adb_session()
+
+        with patch.object(manager, "_spawn_shell_session", return_value=fake_adb):
+            result = manager.execute_adb_shell_command("echo ok")
+
+        assert result == "ok"
+        assert manager.persistent_shell is False
+        mock_device.shell.assert_called_once_with("echo ok")
+
+    def test_shell_batch_single_roundtrip(self, single_device_manager):
+        """Test batched shell commands are sent as one shell call."""
+        manager, mock_device = single_device_manager
+        mock_device.shell.return_value = "Events injected: 1"
+
+        output = manager.shell_batch(["input keyevent HOME", "adb shell monkey -p x 1"])
+
+        mock_device.shell.assert_called_once_with('input keyevent HOME\nmonkey -p x 1')
+        assert output == "Events injected: 1"
+
+    @pytest.mark.skipif(os.name == "nt", reason="uses a local POSIX sh as the adb shell")
+    def test_shell_batch_survives_terminators_and_comments(
+        self,
+        single_device_manager,
+        local_sh_session,
+    ):
+        """Test commands ending in `;` or `&`, or holding a comment, do not break the batch."""
+        manager, mock_device = single_device_manager
+        manager.persistent_shell = True
+
+        with patch.object(manager, "_spawn_shell_session", side_effect=local_sh_session):
+            output = manager.shell_batch(
+                ["echo one;", "true &", "echo two # trailing comment", "echo three"])
 
-    @patch('adbdevicemanager.AdbDeviceManager.check_adb_installed')
-    @patch('adbdevicemanager.AdbDeviceManager.get_available_devices')
-    @patch('adbdevicemanager.AdbClient')
-    def test_launch_app_default_uses_monkey(self, mock_adb_client, mock_get_devices, mock_check_adb):
+        assert output == "one\ntwo\nthree\n"
+        mock_device.shell.assert_not_called()
+
+    def test_launch_app_default_uses_monkey(self, single_device_manager):
         """Test app launch using package default launcher."""
-        mock_check_adb.return_value = True
-        mock_get_devices.return_value = ["device123"]
-        mock_device = MagicMock()
+        manager, mock_device = single_device_manager
         mock_device.shell.return_value = "Events injected: 1"
-        mock_adb_client.return_value.device.return_value = mock_device
 
-        manager = AdbDeviceManager(device_name=None, exit_on_error=False)
         output = manager.launch_app("com.example.app")
 
         mock_device.shell.assert_called_with(
@@ -191,57 +477,69 @@ class TestAdbDeviceManager:
         )
         assert "Events injected: 1" in output
 
-    @patch('adbdevicemanager.AdbDeviceManager.check_adb_installed')
-    @patch('adbdevicemanager.AdbDeviceManager.get_available_devices')
-    @patch('adbdevicemanager.AdbClient')
-    def test_hot_reload_writes_command_to_stdin(self, mock_adb_client, mock_get_devices, mock_check_adb):
+    def test_launch_app_stop_first_uses_single_shell_call(self, single_device_manager):
+        """Test force-stop and activity launch are sent as one shell command."""
+        manager, mock_device = single_device_manager
+        mock_device.shell.return_value = "Starting: Intent { cmp=com.example.app/.MainActivity }"
+
+        output = manager.launch_app(
+            "com.example.app", activity_name=".MainActivity", stop_first=True)
+
+        mock_device.shell.assert_called_once_with(
+            "am force-stop com.example.app; am start -n com.example.app/.MainActivity"
+        )
+        assert output == (
+            "Force-stopped com.example.app\n"
+            "Starting: Intent { cmp=com.example.app/.MainActivity }"
+        )
+
+    def test_hot_reload_writes_command_to_stdin(self, single_device_manager):
         """Test hot reload command is sent to running flutter process."""
-        mock_check_adb.return_value = True
-        mock_get_devices.return_value = ["device123"]
-        mock_device = MagicMock()
-        mock_adb_client.return_value.device.return_value = mock_device
+        manager, mock_device = single_device_manager
 
-        manager = AdbDeviceManager(device_name=None, exit_on_error=False)
-        mock_process = MagicMock()
-        mock_process.poll.return_value = None
-        mock_process.stdin = MagicMock()
+        mock_process = Mock(
+            spec_set=["poll", "stdin"],
+            stdin=Mock(spec_set=["fileno", "write"], **{"fileno.return_value": 42}),
+            **{"poll.return_value": None},
+        )
         manager.flutter_process = mock_process
 
-        result = manager.hot_reload_flutter_run()
+        with patch('adbdevicemanager.os.write') as mock_write:
+            result = manager.hot_reload_flutter_run()
 
-        mock_process.stdin.write.assert_called_once_with("r\n")
-        mock_process.stdin.flush.assert_called_once()
+        mock_write.assert_called_once_with(42, b"r\n")
+        mock_process.stdin.write.assert_not_called()
         assert "Hot reload command sent" in result
 
-    @patch('adbdevicemanager.time.sleep')
-    @patch('adbdevicemanager.subprocess.Popen')
-    @patch('adbdevicemanager.shutil.which')
-    @patch('adbdevicemanager.AdbDeviceManager.check_adb_installed')
-    @patch('adbdevicemanager.AdbDeviceManager.get_available_devices')
-    @patch('adbdevicemanager.AdbClient')
-    def test_start_flutter_run_starts_process(
+    @patch('adbdevicemanager.select.select')
+    @patch('adbdevicemanager.os.write')
+    def test_hot_reload_reports_full_stdin_pipe(
         self,
-        mock_adb_client,
-        mock_get_devices,
-        mock_check_adb,
-        mock_which,
-        mock_popen,
-        mock_sleep,
-        tmp_path,
+        mock_write,
+        mock_select,
+        single_device_manager,
     ):
-        """Test starting managed flutter run process."""
-        mock_check_adb.return_value = True
-        mock_get_devices.return_value = ["device123"]
-        mock_device = MagicMock()
-        mock_adb_client.return_value.device.return_value = mock_device
-        mock_which.return_value = "/usr/bin/flutter"
+        """Test hot reload returns an error instead of blocking on a full stdin pipe."""
+        manager, mock_device = single_device_manager
+        mock_write.side_effect = BlockingIOError()
+        mock_select.return_value = ([], [], [])
+
+        mock_process = Mock(
+            spec_set=["poll", "stdin"],
+            stdin=Mock(spec_set=["fileno"], **{"fileno.return_value": 42}),
+            **{"poll.return_value": None},
+        )
+        manager.flutter_process = mock_process
 
-        mock_proc = MagicMock()
-        mock_proc.poll.return_value = None
-        mock_proc.pid = 999
-        mock_popen.return_value = mock_proc
+        result = manager.hot_reload_flutter_run()
+
+        mock_select.assert_called_once_with([], [42], [], 0.1)
+        assert "hot reload command was not sent" in result
+
+    def test_start_flutter_run_starts_process(self, tmp_path, single_device_manager, flutter_env):
+        """Test starting managed flutter run process."""
+        manager, mock_device = single_device_manager
 
-        manager = AdbDeviceManager(device_name=None, exit_on_error=False)
         result = manager.start_flutter_run(
             project_dir=str(tmp_path),
             target="lib/main.dart",
@@ -249,30 +547,128 @@ class TestAdbDeviceManager:
             startup_wait_seconds=0,
         )
 
-        called_command = mock_popen.call_args.args[0]
-        assert called_command[0] == "/usr/bin/flutter"
-        assert called_command[1:4] == ["run", "-d", "device123"]
-        assert "--dart-define=FOO=bar" in called_command
+        called_command = shlex.join(flutter_env.args)
+        assert called_command.startswith("/usr/bin/flutter run -d device123 ")
+        assert " --dart-define=FOO=bar" in called_command
         assert "Started flutter run" in result
+        if os.name != "nt":
+            # start_flutter_run only switches stdin to non-blocking on POSIX.
+            assert os.get_blocking(flutter_env.stdin.fileno()) is False
+
+    def test_stop_flutter_run_returns_once_process_quits(self, single_device_manager):
+        """Test graceful stop returns as soon as the process handles `q`."""
+        manager, mock_device = single_device_manager
+
+        manager.flutter_process = subprocess.Popen(
+            [sys.executable, "-c", "import sys; sys.stdin.readline()"],
+            stdin=subprocess.PIPE,
+            text=True,
+        )
+
+        result = manager.stop_flutter_run(graceful_wait_seconds=10)
+
+        assert "Stopped flutter run gracefully" in result
+        assert manager.flutter_process is None
+
+    def test_tail_file_reads_last_lines_across_chunks(self, tmp_path):
+        """Test tailing a log larger than one read block returns only the last lines."""
+        log_path = tmp_path / "flutter.log"
+        log_path.write_bytes(
+            b"".join(f"line {i}\r\n".encode() for i in range(5000)))
+
+        result = AdbDeviceManager._tail_file(str(log_path), lines=3)
+
+        assert result == "line 4997\nline 4998\nline 4999"
+
+    @pytest.mark.skipif(not hasattr(os, "posix_fadvise"), reason="posix_fadvise not supported")
+    def test_tail_file_drops_cached_prefix(self, tmp_path):
+        """Test the already-consumed log prefix is released from the page cache."""
+        log_path = tmp_path / "flutter.log"
+        log_path.write_bytes(
+            b"".join(f"line {i}\n".encode() for i in range(5000)))
+
+        with patch('adbdevicemanager.os.posix_fadvise') as mock_fadvise:
+            result = AdbDeviceManager._tail_file(
+                str(log_path), lines=3, drop_cached_prefix=True)
+
+        assert result == "line 4997\nline 4998\nline 4999"
+        _, offset, length, advice = mock_fadvise.call_args.args
+        assert offset == 0
+        assert 0 < length < log_path.stat().st_size
+        assert advice == os.POSIX_FADV_DONTNEED
+
+    def test_tail_file_empty_log(self, tmp_path):
+        """Test tailing an empty log file."""
+        log_path = tmp_path / "flutter.log"
+        log_path.write_bytes(b"")
+
+        assert AdbDeviceManager._tail_file(str(log_path)) == "(log file is empty)"
+
+    def test_stop_flutter_run_force_kills_unresponsive_process(self, single_device_manager):
+        """Test stop falls back to kill when the process ignores `q`."""
+        manager, mock_device = single_device_manager
+
+        process = subprocess.Popen(
+            [sys.executable, "-c", "import time; time.sleep(30)"],
+            stdin=subprocess.PIPE,
+            text=True,
+        )
+        manager.flutter_process = process
+
+        result = manager.stop_flutter_run(graceful_wait_seconds=1)
+
+        assert "Force-killed flutter run process" in result
+        assert process.returncode is not None
+
+    @patch('adbdevicemanager.AdbDeviceManager._open_pidfd', return_value=None)
+    @patch('adbdevicemanager.AdbDeviceManager._wait_for_exit', return_value=False)
+    def test_stop_flutter_run_keeps_process_when_kill_is_unconfirmed(
+        self,
+        mock_wait_for_exit,
+        mock_open_pidfd,
+        single_device_manager,
+    ):
+        """Test stop does not report a force-kill the process did not confirm."""
+        manager, mock_device = single_device_manager
+        mock_process = Mock(
+            spec_set=["pid", "poll", "stdin", "kill"],
+            pid=999,
+            stdin=None,
+            **{"poll.return_value": None},
+        )
+        manager.flutter_process = mock_process
+
+        result = manager.stop_flutter_run(graceful_wait_seconds=1)
+
+        mock_open_pidfd.assert_called_once_with(999)
+        mock_process.kill.assert_called_once()
+        assert "still tracked" in result
+        assert manager.flutter_process is mock_process
+
+    def test_pidfd_wait_returns_on_process_exit(self):
+        """Test pidfd wait wakes on child exit and times out on a live child."""
+        quick = subprocess.Popen([sys.executable, "-c", "pass"])
+        assert AdbDeviceManager._pidfd_wait(quick.pid, 10) is True
+        quick.wait()
+
+        slow = subprocess.Popen(
+            [sys.executable, "-c", "import time; time.sleep(10)"])
+        try:
+            assert AdbDeviceManager._pidfd_wait(slow.pid, 0.05) is False
+        finally:
+            slow.kill()
+            slow.wait()
 
     @patch('adbdevicemanager.subprocess.run')
-    @patch('adbdevicemanager.AdbDeviceManager.check_adb_installed')
-    @patch('adbdevicemanager.AdbDeviceManager.get_available_devices')
-    @patch('adbdevicemanager.AdbClient')
     def test_discover_vm_service_port_from_logcat(
         self,
-        mock_adb_client,
-        mock_get_devices,
-        mock_check_adb,
         mock_subprocess_run,
+        single_device_manager,
     ):
-        mock_check_adb.return_value = True
-        mock_get_devices.return_value = ["device123"]
-        mock_device = MagicMock()
+        manager, mock_device = single_device_manager
         mock_device.shell.return_value = "24680"
-        mock_adb_client.return_value.device.return_value = mock_device
 
-        mock_subprocess_run.return_value = MagicMock(
+        mock_subprocess_run.return_value = SimpleNamespace(
             returncode=0,
             stdout=(
                 "I/flutter: The Dart VM service is listening on http://127.0.0.1:40123/abc=/\n"
@@ -281,36 +677,27 @@ class TestAdbDeviceManager:
             stderr="",
         )
 
-        manager = AdbDeviceManager(device_name=None, exit_on_error=False)
         port = manager._discover_vm_service_port("com.example.app")
 
         assert port == 40124
 
     @patch('adbdevicemanager.time.sleep')
     @patch('adbdevicemanager.subprocess.Popen')
-    @patch('adbdevicemanager.AdbDeviceManager.check_adb_installed')
-    @patch('adbdevicemanager.AdbDeviceManager.get_available_devices')
-    @patch('adbdevicemanager.AdbClient')
     def test_hot_reload_vscode_session_uses_attach_and_sends_reload(
         self,
-        mock_adb_client,
-        mock_get_devices,
-        mock_check_adb,
         mock_popen,
         mock_sleep,
         tmp_path,
+        single_device_manager,
     ):
-        mock_check_adb.return_value = True
-        mock_get_devices.return_value = ["device123"]
-        mock_device = MagicMock()
-        mock_adb_client.return_value.device.return_value = mock_device
-
-        manager = AdbDeviceManager(device_name=None, exit_on_error=False)
+        manager, mock_device = single_device_manager
 
-        mock_proc = MagicMock()
-        mock_proc.poll.return_value = None
-        mock_proc.stdin = MagicMock()
-        mock_proc.returncode = 0
+        mock_proc = Mock(
+            spec_set=["poll", "stdin", "returncode", "wait", "kill"],
+            stdin=Mock(spec_set=["write", "flush"]),
+            returncode=0,
+            **{"poll.return_value": None},
+        )
         mock_popen.return_value = mock_proc
 
         with patch.object(manager, "_resolve_flutter_executable", return_value="/usr/bin/flutter"):
@@ -323,41 +710,31 @@ class TestAdbDeviceManager:
                     action_wait_seconds=1,
                 )
 
-        called_command = mock_popen.call_args.args[0]
-        assert called_command[0:2] == ["/usr/bin/flutter", "attach"]
-        assert "--app-id" in called_command
-        assert "com.example.app" in called_command
-        assert "--debug-port" in called_command
-        assert "40123" in called_command
+        called_command = shlex.join(mock_popen.call_args.args[0])
+        assert called_command.startswith("/usr/bin/flutter attach ")
+        assert " --app-id com.example.app" in called_command
+        assert " --debug-port 40123" in called_command
         mock_proc.stdin.write.assert_any_call("r\n")
         mock_proc.stdin.write.assert_any_call("q\n")
         assert "Triggered hot reload via flutter attach" in result
 
     @patch('adbdevicemanager.time.sleep')
     @patch('adbdevicemanager.subprocess.Popen')
-    @patch('adbdevicemanager.AdbDeviceManager.check_adb_installed')
-    @patch('adbdevicemanager.AdbDeviceManager.get_available_devices')
-    @patch('adbdevicemanager.AdbClient')
     def test_hot_reload_vscode_session_prefers_discovered_debug_url(
         self,
-        mock_adb_client,
-        mock_get_devices,
-        mock_check_adb,
         mock_popen,
         mock_sleep,
         tmp_path,
+        single_device_manager,
     ):
-        mock_check_adb.return_value = True
-        mock_get_devices.return_value = ["device123"]
-        mock_device = MagicMock()
-        mock_adb_client.return_value.device.return_value = mock_device
-
-        manager = AdbDeviceManager(device_name=None, exit_on_error=False)
+        manager, mock_device = single_device_manager
 
-        mock_proc = MagicMock()
-        mock_proc.poll.return_value = None
-        mock_proc.stdin = MagicMock()
-        mock_proc.returncode = 0
+        mock_proc = Mock(
+            spec_set=["poll", "stdin", "returncode", "wait", "kill"],
+            stdin=Mock(spec_set=["write", "flush"]),
+            returncode=0,
+            **{"poll.return_value": None},
+        )
         mock_popen.return_value = mock_proc
 
         with patch.object(manager, "_resolve_flutter_executable", return_value="/usr/bin/flutter"):
@@ -370,35 +747,26 @@ class TestAdbDeviceManager:
                         action_wait_seconds=1,
                     )
 
-        called_command = mock_popen.call_args.args[0]
-        assert "--debug-url" in called_command
-        assert "http://127.0.0.1:40123/abc=/" in called_command
+        called_command = shlex.join(mock_popen.call_args.args[0])
+        assert " --debug-url http://127.0.0.1:40123/abc=/" in called_command
 
     @patch('adbdevicemanager.time.sleep')
     @patch('adbdevicemanager.subprocess.Popen')
-    @patch('adbdevicemanager.AdbDeviceManager.check_adb_installed')
-    @patch('adbdevicemanager.AdbDeviceManager.get_available_devices')
-    @patch('adbdevicemanager.AdbClient')
     def test_hot_reload_vscode_session_prefers_logcat_url_over_host_url(
         self,
-        mock_adb_client,
-        mock_get_devices,
-        mock_check_adb,
         mock_popen,
         mock_sleep,
         tmp_path,
+        single_device_manager,
     ):
-        mock_check_adb.return_value = True
-        mock_get_devices.return_value = ["device123"]
-        mock_device = MagicMock()
-        mock_adb_client.return_value.device.return_value = mock_device
-
-        manager = AdbDeviceManager(device_name=None, exit_on_error=False)
+        manager, mock_device = single_device_manager
 
-        mock_proc = MagicMock()
-        mock_proc.poll.return_value = None
-        mock_proc.stdin = MagicMock()
-        mock_proc.returncode = 0
+        mock_proc = Mock(
+            spec_set=["poll", "stdin", "returncode", "wait", "kill"],
+            stdin=Mock(spec_set=["write", "flush"]),
+            returncode=0,
+            **{"poll.return_value": None},
+        )
         mock_popen.return_value = mock_proc
 
         with patch.object(manager, "_resolve_flutter_executable", return_value="/usr/bin/flutter"):
@@ -412,28 +780,19 @@ class TestAdbDeviceManager:
                             action_wait_seconds=1,
                         )
 
-        called_command = mock_popen.call_args.args[0]
-        assert "--debug-url" in called_command
-        assert "http://127.0.0.1:40124/from_logcat=/" in called_command
+        called_command = shlex.join(mock_popen.call_args.args[0])
+        assert " --debug-url http://127.0.0.1:40124/from_logcat=/" in called_command
         assert "http://127.0.0.1:40123/from_host=/" not in called_command
 
     @patch('adbdevicemanager.subprocess.run')
-    @patch('adbdevicemanager.AdbDeviceManager.check_adb_installed')
-    @patch('adbdevicemanager.AdbDeviceManager.get_available_devices')
-    @patch('adbdevicemanager.AdbClient')
     def test_discover_vm_service_debug_url_from_host(
         self,
-        mock_adb_client,
-        mock_get_devices,
-        mock_check_adb,
         mock_subprocess_run,
+        single_device_manager,
     ):
-        mock_check_adb.return_value = True
-        mock_get_devices.return_value = ["device123"]
-        mock_device = MagicMock()
-        mock_adb_client.return_value.device.return_value = mock_device
+        manager, mock_device = single_device_manager
 
-        mock_subprocess_run.return_value = MagicMock(
+        mock_subprocess_run.return_value = SimpleNamespace(
             returncode=0,
             stdout=(
                 "dart.exe development-service --vm-service-uri=http://127.0.0.1:40123/abc=/\n"
@@ -442,28 +801,87 @@ class TestAdbDeviceManager:
             stderr="",
         )
 
-        manager = AdbDeviceManager(device_name=None, exit_on_error=False)
         url = manager._discover_vm_service_debug_url_from_host()
 
         assert url == "http://127.0.0.1:40124/def=/"
 
-    @patch('adbdevicemanager.AdbDeviceManager.check_adb_installed')
-    @patch('adbdevicemanager.AdbDeviceManager.get_available_devices')
-    @patch('adbdevicemanager.AdbClient')
+    @patch('adbdevicemanager.subprocess.run')
+    def test_take_screenshot_streams_png_over_exec_out(
+        self,
+        mock_subprocess_run,
+        tmp_path,
+        monkeypatch,
+        single_device_manager,
+    ):
+        """Test screenshot bytes are streamed from exec-out and compressed on the host."""
+        manager, mock_device = single_device_manager
+
+        png = io.BytesIO()
+        PILImage.new("RGB", (100, 220), color=(35, 70, 135)).save(png, format="PNG")
+        mock_subprocess_run.return_value = SimpleNamespace(
+            returncode=0, stdout=png.getvalue(), stderr=b"")
+
+        monkeypatch.chdir(tmp_path)
+        manager.take_screenshot()
+
+        assert mock_subprocess_run.call_args.args[0] == [
+            "adb", "-s", "device123", "exec-out", "screencap", "-p"]
+        mock_device.shell.assert_not_called()
+        mock_device.pull.assert_not_called()
+        assert not (tmp_path / "screenshot.png").exists()
+        with PILImage.open(tmp_path / "compressed_screenshot.png") as img:
+            assert img.size == (34, 74)
+
+    @patch('adbdevicemanager.subprocess.run')
+    def test_get_uilayout_lists_labelled_clickable_elements(
+        self,
+        mock_subprocess_run,
+        single_device_manager,
+    ):
+        """Test only clickable nodes with text or description are reported."""
+        manager, mock_device = single_device_manager
+        mock_subprocess_run.return_value = SimpleNamespace(
+            returncode=0,
+            stdout=UI_DUMP_XML.encode("utf-8") + b"UI hierchary dumped to: /dev/tty\n",
+            stderr=b"",
+        )
+
+        result = manager.get_uilayout()
+
+        assert mock_subprocess_run.call_args.args[0] == [
+            "adb", "-s", "device123", "exec-out", "uiautomator", "dump", "/dev/tty"]
+        mock_device.shell.assert_not_called()
+        mock_device.pull.assert_not_called()
+
+        assert result == (
+            "Clickable element:\n"
+            "  Text: Sign in\n"
+            "  Bounds: [0,100][200,300]\n"
+            "  Center: (100, 200)\n"
+            "\n"
+            "Clickable element:\n"
+            "  Description: Back\n"
+            "  Bounds: [10,10][50,50]\n"
+            "  Center: (30, 30)\n"
+            "\n"
+            "Clickable element:\n"
+            "  Text: Card\n"
+            "  Bounds: [0,500][400,700]\n"
+            "  Center: (200, 600)\n"
+            "\n"
+            "Clickable element:\n"
+            "  Text: Open\n"
+            "  Bounds: [300,600][400,700]\n"
+            "  Center: (350, 650)"
+        )
+
     def test_compare_screen_with_figma_generates_report(
         self,
-        mock_adb_client,
-        mock_get_devices,
-        mock_check_adb,
         tmp_path,
+        single_device_manager,
     ):
         """Test diff report generation with mocked screenshot and figma fetch."""
-        mock_check_adb.return_value = True
-        mock_get_devices.return_value = ["device123"]
-        mock_device = MagicMock()
-        mock_adb_client.return_value.device.return_value = mock_device
-
-        manager = AdbDeviceManager(device_name=None, exit_on_error=False)
+        manager, mock_device = single_device_manager
 
         emu_source = tmp_path / "emu.png"
         fig_source = tmp_path / "fig.png"
@@ -503,22 +921,12 @@ class TestAdbDeviceManager:
         for _, artifact_path in artifacts.items():
             assert Path(artifact_path).exists()
 
-    @patch('adbdevicemanager.AdbDeviceManager.check_adb_installed')
-    @patch('adbdevicemanager.AdbDeviceManager.get_available_devices')
-    @patch('adbdevicemanager.AdbClient')
     def test_compare_screen_with_figma_requires_token(
         self,
-        mock_adb_client,
-        mock_get_devices,
-        mock_check_adb,
+        single_device_manager,
     ):
         """Test token requirement when figma_token arg and FIGMA_TOKEN env are both absent."""
-        mock_check_adb.return_value = True
-        mock_get_devices.return_value = ["device123"]
-        mock_device = MagicMock()
-        mock_adb_client.return_value.device.return_value = mock_device
-
-        manager = AdbDeviceManager(device_name=None, exit_on_error=False)
+        manager, mock_device = single_device_manager
 
         with patch.dict(os.environ, {}, clear=True):
             with pytest.raises(RuntimeError) as exc_info:
@@ -3,15 +3,12 @@ Integration tests for the complete server initialization flow
 """
 
 import os
-import sys
 import tempfile
-from unittest.mock import MagicMock, patch
+from types import SimpleNamespace
+from unittest.mock import MagicMock
 
 from adbdevicemanager import AdbDeviceManager
 
-# Add the parent directory to the path so we can import our modules
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
 
 class TestServerIntegration:
     """Test complete server initialization scenarios"""
@@ -21,7 +18,7 @@ class TestServerIntegration:
         self.temp_dir = tempfile.mkdtemp()
         self.config_file = os.path.join(self.temp_dir, "config.yaml")
 
-    def _simulate_server_initialization(self, config_file_path):
+    def _simulate_server_initialization(self, config_file_path, log_fn=print):
         """
         Simulate the complete server initialization process
         Returns: (device_manager, messages)
@@ -57,45 +54,44 @@ class TestServerIntegration:
                 f"Config file {config_file_path} not found, using auto-selection for device")
 
         # Initialize device manager (with mocked dependencies)
-        device_manager = AdbDeviceManager(device_name, exit_on_error=False)
+        device_manager = AdbDeviceManager(
+            device_name, exit_on_error=False, log_fn=log_fn)
 
         return device_manager, messages
 
-    @patch('adbdevicemanager.AdbDeviceManager.check_adb_installed')
-    @patch('adbdevicemanager.AdbDeviceManager.get_available_devices')
-    @patch('adbdevicemanager.AdbClient')
-    def test_no_config_auto_selection_success(self, mock_adb_client, mock_get_devices, mock_check_adb):
+    def test_no_config_auto_selection_success(self, manager_patches):
         """Test successful server start with no config file and single device"""
+        mock_check_adb, mock_get_devices, mock_adb_client = manager_patches
+
         # Setup mocks
         mock_check_adb.return_value = True
         mock_get_devices.return_value = ["device123"]
-        mock_device = MagicMock()
-        mock_adb_client.return_value.device.return_value = mock_device
+        mock_device = SimpleNamespace(serial="device123")
+        mock_adb_client.device.return_value = mock_device
 
         # Use non-existent config file
         non_existent_config = os.path.join(self.temp_dir, "non_existent.yaml")
 
-        with patch('builtins.print') as mock_print:
-            device_manager, messages = self._simulate_server_initialization(
-                non_existent_config)
+        mock_log = MagicMock()
+        device_manager, messages = self._simulate_server_initialization(
+            non_existent_config, log_fn=mock_log)
 
         # Verify results
         assert device_manager.device == mock_device
         assert any("not found" in msg for msg in messages)
         assert any("auto-selection" in msg for msg in messages)
-        mock_print.assert_called_with(
+        mock_log.assert_called_with(
             "No device specified, automatically selected: device123")
 
-    @patch('adbdevicemanager.AdbDeviceManager.check_adb_installed')
-    @patch('adbdevicemanager.AdbDeviceManager.get_available_devices')
-    @patch('adbdevicemanager.AdbClient')
-    def test_config_with_null_device_auto_selection(self, mock_adb_client, mock_get_devices, mock_check_adb):
+    def test_config_with_null_device_auto_selection(self, manager_patches):
         """Test server start with config file containing name: null"""
+        mock_check_adb, mock_get_devices, mock_adb_client = manager_patches
+
         # Setup mocks
         mock_check_adb.return_value = True
         mock_get_devices.return_value = ["device456"]
-        mock_device = MagicMock()
-        mock_adb_client.return_value.device.return_value = mock_device
+        mock_device = SimpleNamespace(serial="device456")
+        mock_adb_client.device.return_value = mock_device
 
         # Create config with null device name
         config_content = """
@@ -105,27 +101,26 @@ device:
         with open(self.config_file, 'w') as f:
             f.write(config_content)
 
-        with patch('builtins.print') as mock_print:
-            device_manager, messages = self._simulate_server_initialization(
-                self.config_file)
+        mock_log = MagicMock()
+        device_manager, messages = self._simulate_server_initialization(
+            self.config_file, log_fn=mock_log)
 
         # Verify results
         assert device_manager.device == mock_device
         assert any("Loaded config" in msg for msg in messages)
         assert any("auto-select" in msg for msg in messages)
-        mock_print.assert_called_with(
+        mock_log.assert_called_with(
             "No device specified, automatically selected: device456")
 
-    @patch('adbdevicemanager.AdbDeviceManager.check_adb_installed')
-    @patch('adbdevicemanager.AdbDeviceManager.get_available_devices')
-    @patch('adbdevicemanager.AdbClient')
-    def test_config_with_specific_device(self, mock_adb_client, mock_get_devices, mock_check_adb):
+    def test_config_with_specific_device(self, manager_patches):
         """Test server start with config file specifying a device"""
+        mock_check_adb, mock_get_devices, mock_adb_client = manager_patches
+
         # Setup mocks
         mock_check_adb.return_value = True
         mock_get_devices.return_value = ["device123", "device456"]
-        mock_device = MagicMock()
-        mock_adb_client.return_value.device.return_value = mock_device
+        mock_device = SimpleNamespace(serial="device456")
+        mock_adb_client.device.return_value = mock_device
 
         # Create config with specific device name
         config_content = """
@@ -140,14 +135,14 @@ device:
 
         # Verify results
         assert device_manager.device == mock_device
-        mock_adb_client.return_value.device.assert_called_once_with(
+        mock_adb_client.device.assert_called_once_with(
             "device456")
         assert any("Configured device: device456" in msg for msg in messages)
 
-    @patch('adbdevicemanager.AdbDeviceManager.check_adb_installed')
-    @patch('adbdevicemanager.AdbDeviceManager.get_available_devices')
-    def test_multiple_devices_no_config_error(self, mock_get_devices, mock_check_adb):
+    def test_multiple_devices_no_config_error(self, manager_patches):
         """Test server initialization fails with multiple devices and no config"""
+        mock_check_adb, mock_get_devices, _ = manager_patches
+
         # Setup mocks
         mock_check_adb.return_value = True
         mock_get_devices.return_value = ["device123", "device456"]
@@ -164,10 +159,10 @@ device:
             assert "device123" in str(e)
             assert "device456" in str(e)
 
-    @patch('adbdevicemanager.AdbDeviceManager.check_adb_installed')
-    @patch('adbdevicemanager.AdbDeviceManager.get_available_devices')
-    def test_device_not_found_error(self, mock_get_devices, mock_check_adb):
+    def test_device_not_found_error(self, manager_patches):
         """Test server initialization fails when specified device is not found"""
+        mock_check_adb, mock_get_devices, _ = manager_patches
+
         # Setup mocks
         mock_check_adb.return_value = True
         mock_get_devices.return_value = ["device123"]